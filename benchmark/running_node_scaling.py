@@ -0,0 +1,112 @@
+"""
+Measure how `ros2 model running_node -ga` scales with the size of the graph.
+
+The verb runs against the in-memory FakeGraphBackend, so no ROS system is
+needed, only a sourced workspace containing ros2model. Example:
+
+    python3 benchmark/running_node_scaling.py --nodes 10 100 1000 --latency 0.001
+
+The fake graph only models call counts and latency. Costs that come from the
+middleware, e.g. the number of service clients alive on the querying node,
+do not show up here and have to be measured against a real system.
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+from ros2model.api.backend import TopicSampler
+from ros2model.api.fake_backend import FakeGraphBackend
+from ros2model.verb.running_node import (RunningNodeVerb, positive_float,
+                                         positive_int)
+
+
+def run(num_nodes, args):
+    """Run a generate-all pass over a fake graph, return (seconds, backend)."""
+    backend = FakeGraphBackend(
+        num_nodes=num_nodes,
+        num_subscribers=args.endpoints,
+        num_publishers=args.endpoints,
+        num_service_servers=args.endpoints,
+        num_service_clients=args.endpoints,
+        num_action_servers=args.endpoints,
+        num_action_clients=args.endpoints,
+        num_parameters=args.parameters,
+        latency=args.latency,
+    )
+    sampler = None
+    if args.sample_window > 0:
+        sampler = TopicSampler(
+            backend,
+            window=args.sample_window,
+            max_subscriptions=args.max_subscriptions,
+            budget=args.sample_budget,
+        )
+    verb = RunningNodeVerb()
+    with tempfile.TemporaryDirectory() as output_dir, backend:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            verb.generate_all(backend, output_dir, True, False, sampler)
+            elapsed = time.perf_counter() - start
+    return elapsed, backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--nodes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="Node counts to benchmark",
+    )
+    parser.add_argument(
+        "--endpoints",
+        type=int,
+        default=2,
+        help="Number of endpoints of each kind per node",
+    )
+    parser.add_argument(
+        "--parameters",
+        type=int,
+        default=5,
+        help="Number of parameters per node",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Simulated latency of every backend call in seconds",
+    )
+    parser.add_argument(
+        "--sample-window",
+        type=float,
+        default=0.0,
+        help="Sample the publishers for this many seconds, 0 disables it",
+    )
+    parser.add_argument(
+        "--max-subscriptions",
+        type=positive_int,
+        default=32,
+        help="Maximum number of topics sampled at the same time",
+    )
+    parser.add_argument(
+        "--sample-budget",
+        type=positive_float,
+        default=float("inf"),
+        help="Total seconds spent sampling",
+    )
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'wall [s]':>10} {'calls':>8} {'calls/node':>11}")
+    for num_nodes in args.nodes:
+        elapsed, backend = run(num_nodes, args)
+        print(
+            f"{num_nodes:>8} {elapsed:>10.3f} {backend.total_calls:>8} "
+            f"{backend.total_calls / max(num_nodes, 1):>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,43 @@ from pathlib import Path
 from typing import Iterable
 
 from ament_index_python import get_package_share_directory
+from ament_index_python.packages import PackageNotFoundError
 from jinja2 import Environment, FileSystemLoader
 from rcl_interfaces.msg import ParameterType
 from ros2node.api import TopicInfo
 
+PRIMITIVE_TYPES = [
+    "bool",
+    "int8",
+    "uint8",
+    "int16",
+    "uint16",
+    "int32",
+    "uint32",
+    "int64",
+    "uint64",
+    "float32",
+    "float64",
+    "string",
+    "byte",
+    "time",
+    "duration",
+    "Header",
+    "bool[]",
+    "int8[]",
+    "uint8[]",
+    "int16[]",
+    "uint16[]",
+    "int32[]",
+    "uint32[]",
+    "int64[]",
+    "uint64[]",
+    "float32[]",
+    "float64[]",
+    "string[]",
+    "byte[]",
+]
+
 
 @dataclass
 class Message:
@@ -75,7 +108,7 @@ def split_line(line: str):
         return split[0].strip(), None
 
 
-def process_msg_file(msg_file: Path, package_name: str):
+def process_msg_file(msg_file: Path, package_name: str, resolver=None):
     """Process a message file."""
     name = msg_file.stem
     message = {}
@@ -86,6 +119,9 @@ def process_msg_file(msg_file: Path, package_name: str):
         line = line.replace("\n", "")
         if len(line) == 0:
             continue
+        if resolver is not None:
+            message.update(resolver.expand_line(line, package_name))
+            continue
         variablename, typename = get_type_format(line, package_name)
         if typename is None:
             continue
@@ -94,7 +130,7 @@ def process_msg_file(msg_file: Path, package_name: str):
     return name, message
 
 
-def process_srv_file(srv_file: Path, package_name: str):
+def process_srv_file(srv_file: Path, package_name: str, resolver=None):
     """Process a message file."""
     name = srv_file.stem
     request = {}
@@ -105,6 +141,10 @@ def process_srv_file(srv_file: Path, package_name: str):
         if "---" in line:
             resp = True
             continue
+        if resolver is not None:
+            section = response if resp else request
+            section.update(resolver.expand_line(line, package_name))
+            continue
         variablename, typename = get_type_format(line, package_name)
         if typename is None:
             continue
@@ -116,7 +156,7 @@ def process_srv_file(srv_file: Path, package_name: str):
     return name, request, response
 
 
-def process_action_file(action_file: Path, package_name: str):
+def process_action_file(action_file: Path, package_name: str, resolver=None):
     """Process an aciton file."""
     name = action_file.stem
     goal = {}
@@ -128,6 +168,11 @@ def process_action_file(action_file: Path, package_name: str):
         if "---" in line:
             border += 1
             continue
+        if resolver is not None:
+            if border <= 2:
+                section = (goal, result, feedback)[border]
+                section.update(resolver.expand_line(line, package_name))
+            continue
         variablename, typename = get_type_format(line, package_name)
         if typename is None:
             continue
@@ -141,75 +186,126 @@ def process_action_file(action_file: Path, package_name: str):
     return name, goal, result, feedback
 
 
+def format_type_reference(typename: str, package_name: str):
+    """Format a non primitive type as a quoted reference."""
+    # For ROS messages if the referenced interface is created within the same package where is declared, the pacakge name doesn't have to be defined. For consistency on the description of messages we need it complete.
+    if "/" not in typename:
+        typename = package_name + "/msg/" + typename
+    typename = "'" + typename + "'"
+    return typename.replace("[]", "") + "[]"
+
+
 def get_type_format(line: str, package_name: str):
-    primitive_types = [
-        "bool",
-        "int8",
-        "uint8",
-        "int16",
-        "uint16",
-        "int32",
-        "uint32",
-        "int64",
-        "uint64",
-        "float32",
-        "float64",
-        "string",
-        "byte",
-        "time",
-        "duration",
-        "Header",
-        "bool[]",
-        "int8[]",
-        "uint8[]",
-        "int16[]",
-        "uint16[]",
-        "int32[]",
-        "uint32[]",
-        "int64[]",
-        "uint64[]",
-        "float32[]",
-        "float64[]",
-        "string[]",
-        "byte[]",
-    ]
     typename, variablename = split_line(line)
     if typename is not None:
-        if typename not in primitive_types:
-            # For ROS messages if the referenced interface is created within the same package where is declared, the pacakge name doesn't have to be defined. For consistency on the description of messages we need it complete.
-            if "/" not in typename:
-                typename = package_name + "/msg/" + typename
-            typename = "'" + typename + "'"
-            typename = typename.replace("[]", "") + "[]"
+        if typename not in PRIMITIVE_TYPES:
+            typename = format_type_reference(typename, package_name)
     return variablename, typename
 
 
-def process_msg_dir(msg_path: Path, package_name: str):
+class NestedTypeResolver:
+    """
+    Expand nested message types into flat field layouts.
+
+    A field of a nested type, e.g. `geometry_msgs/Pose pose`, is replaced by
+    the leaf fields of that type with dotted names like `pose.position.x`.
+    Fields of array types get a `[]` suffix in the prefix, e.g.
+    `poses[].position.x`. Types that cannot be found are kept as a quoted
+    reference, formatted like without expansion.
+
+    The type references form a DAG. Every type is looked up and parsed only
+    once per resolver, its layout is memoized and reused wherever the type
+    appears again, so one resolver should be shared by a whole run.
+    Cyclic references raise a ValueError.
+    """
+
+    def __init__(self):
+        self._layouts = {}
+        self._resolving = []
+
+    def expand_line(self, line: str, package_name: str) -> dict:
+        """Return the flat fields of a spec file line as a name: type dict."""
+        typename, variablename = split_line(line)
+        if typename is None or variablename is None:
+            return {}
+        return dict(self._expand_field(variablename, typename, package_name))
+
+    def resolve(self, type_name: str):
+        """Return the flat layout of a `pkg/msg/Type`, None if not found."""
+        if type_name in self._layouts:
+            return self._layouts[type_name]
+        if type_name in self._resolving:
+            cycle = self._resolving[self._resolving.index(type_name):]
+            raise ValueError(
+                "Cyclic type reference: " + " -> ".join(cycle + [type_name])
+            )
+        msg_file = self._find_msg_file(type_name)
+        layout = None
+        if msg_file is not None:
+            self._resolving.append(type_name)
+            try:
+                layout = []
+                package_name = type_name.split("/")[0]
+                with msg_file.open() as file:
+                    for line in file:
+                        layout.extend(
+                            self.expand_line(line, package_name).items())
+            finally:
+                self._resolving.pop()
+        self._layouts[type_name] = layout
+        return layout
+
+    def _expand_field(self, name: str, typename: str, package_name: str):
+        if typename in PRIMITIVE_TYPES:
+            return [(name, typename)]
+        is_array = typename.endswith("[]")
+        type_name = typename.replace("[]", "")
+        if "/" not in type_name:
+            type_name = package_name + "/msg/" + type_name
+        layout = self.resolve(type_name)
+        if layout is None:
+            return [(name, format_type_reference(typename, package_name))]
+        prefix = name + "[]" if is_array else name
+        return [(prefix + "." + field, t) for field, t in layout]
+
+    @staticmethod
+    def _find_msg_file(type_name: str):
+        package_name, _, name = type_name.partition("/msg/")
+        try:
+            package_share_path = get_package_share_directory(package_name)
+        except (PackageNotFoundError, ValueError):
+            return None
+        msg_file = Path(package_share_path) / "msg" / (name + ".msg")
+        return msg_file if msg_file.is_file() else None
+
+
+def process_msg_dir(msg_path: Path, package_name: str, resolver=None):
     msg_files = get_spec_files(msg_path, "*.msg")
     msgs = []
     for msg_file in msg_files:
-        name, message = process_msg_file(msg_file, package_name)
+        name, message = process_msg_file(msg_file, package_name, resolver)
         msg = Message(name, message)
         msgs.append(msg)
     return msgs
 
 
-def process_srv_dir(msg_path: Path, package_name: str):
+def process_srv_dir(msg_path: Path, package_name: str, resolver=None):
     srv_files = get_spec_files(msg_path, "*.srv")
     srvs = []
     for srv_file in srv_files:
-        name, request, response = process_srv_file(srv_file, package_name)
+        name, request, response = process_srv_file(
+            srv_file, package_name, resolver)
         srv = Service(name, request, response)
         srvs.append(srv)
     return srvs
 
 
-def process_action_dir(msg_path: Path, package_name: str):
+def process_action_dir(msg_path: Path, package_name: str, resolver=None):
     action_files = get_spec_files(msg_path, "*.action")
     actions = []
     for action_file in action_files:
         name, goal, result, feedback = process_action_file(
-            action_file, package_name)
+            action_file, package_name, resolver)
         action = Action(name, goal, result, feedback)
         actions.append(action)
     return actions
@@ -0,0 +1,367 @@
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import List
+
+import rclpy
+from rcl_interfaces.srv import (DescribeParameters, GetParameters,
+                                ListParameters)
+from rclpy.qos import DurabilityPolicy, QoSProfile, ReliabilityPolicy
+from ros2cli.node.direct import DirectNode
+from ros2node.api import (get_action_client_info, get_action_server_info,
+                          get_node_names, get_publisher_info,
+                          get_service_client_info, get_service_server_info,
+                          get_subscriber_info)
+from rosidl_runtime_py.utilities import get_message
+
+TopicStats = namedtuple("TopicStats", ("rate", "bandwidth"))
+
+# Best effort subscriptions are compatible with every publisher. The deep
+# queue keeps high rate topics from dropping messages between two spins.
+SAMPLING_QOS = QoSProfile(
+    depth=100,
+    reliability=ReliabilityPolicy.BEST_EFFORT,
+    durability=DurabilityPolicy.VOLATILE,
+)
+
+
+def call_service(*, node, srv_type, service_name, request, timeout=None):
+    """
+    Call a service and return its response, None if it did not complete.
+
+    The client is destroyed again after the call, so a long running node does
+    not pile up one client per remote node.
+    """
+    client = node.create_client(srv_type, service_name)
+    try:
+        # call as soon as ready
+        ready = client.wait_for_service(timeout_sec=5.0)
+        if not ready:
+            raise RuntimeError("Wait for service timed out")
+
+        future = client.call_async(request)
+        rclpy.spin_until_future_complete(
+            node=node, future=future, timeout_sec=timeout)
+        return future.result()
+    finally:
+        node.destroy_client(client)
+
+
+def call_list_parameters(*, node, node_name, timeout=None):
+    response = call_service(
+        node=node,
+        srv_type=ListParameters,
+        service_name=f"{node_name}/list_parameters",
+        request=ListParameters.Request(),
+        timeout=timeout,
+    )
+
+    # handle response
+    if response is None:
+        return response
+    else:
+        return response.result.names
+
+
+class GraphBackend(ABC):
+    """
+    Access to the ROS graph and the parameters of its nodes.
+
+    The verbs only talk to the graph through this interface, so the source of
+    the information can be swapped, e.g. for a simulated graph.
+    A backend is used as a context manager; it is only valid inside the
+    `with` block.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    @abstractmethod
+    def get_node_names(self, *, include_hidden_nodes=False):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_subscriber_info(self, *, remote_node_name, include_hidden=False):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_publisher_info(self, *, remote_node_name, include_hidden=False):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_service_server_info(self, *, remote_node_name, include_hidden=False):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_service_client_info(self, *, remote_node_name, include_hidden=False):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_action_server_info(self, *, remote_node_name, include_hidden=False):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_action_client_info(self, *, remote_node_name, include_hidden=False):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def list_parameters(self, *, node_name) -> List[str]:
+        """Return the parameter names of a node or None if unavailable."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def describe_parameters(self, *, node_name, parameter_names) -> list:
+        """Return a ParameterDescriptor for each of the given names."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_parameters(self, *, node_name, parameter_names) -> list:
+        """Return a ParameterValue for each of the given names."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def sample_topics(self, topics, *, window, match_timeout=0.0) -> dict:
+        """
+        Subscribe to all topics at once and measure them for window seconds.
+
+        Before the window starts, at most match_timeout seconds are spent
+        waiting for the subscriptions to match their publishers, so a call
+        takes at most window + match_timeout seconds.
+        Return a TopicStats with messages per second and bytes per second for
+        every sampled topic name. Topics that cannot be subscribed to are
+        left out.
+        """
+        raise NotImplementedError()
+
+
+class TopicSampler:
+    """
+    Sample topics through a backend within a total time budget.
+
+    The stats describe a whole topic, summed over all of its publishers.
+    Every distinct topic is therefore sampled only once per sampler and the
+    result is reused for every node publishing it, e.g. /rosout.
+    Topics are sampled in batches of at most max_subscriptions concurrent
+    subscriptions, each batch for the same fixed window. Waiting for the
+    subscriptions to match takes at most another window and never more than
+    the budget left after the window, so the budget is a hard limit. Once the
+    remaining budget is shorter than a window, no further batches are started
+    and the remaining topics stay unsampled.
+    """
+
+    def __init__(self, backend, *, window, max_subscriptions, budget):
+        if window <= 0:
+            raise ValueError("The sampling window must be positive")
+        if max_subscriptions < 1:
+            raise ValueError("At least one subscription must be allowed")
+        self.backend = backend
+        self.window = window
+        self.max_subscriptions = max_subscriptions
+        self.remaining = budget
+        self._stats = {}
+        self._sampled = set()
+
+    def sample(self, topics) -> dict:
+        """Return the stats of all given topics that have been sampled."""
+        topics = list(topics)
+        pending = []
+        for topic in topics:
+            if topic.name not in self._sampled:
+                self._sampled.add(topic.name)
+                pending.append(topic)
+        for i in range(0, len(pending), self.max_subscriptions):
+            if self.remaining < self.window:
+                # left over topics get another chance with the next call
+                self._sampled.difference_update(t.name for t in pending[i:])
+                break
+            start = time.monotonic()
+            self._stats.update(
+                self.backend.sample_topics(
+                    pending[i:i + self.max_subscriptions],
+                    window=self.window,
+                    match_timeout=min(
+                        self.window, self.remaining - self.window),
+                )
+            )
+            self.remaining -= time.monotonic() - start
+        return {t.name: self._stats[t.name]
+                for t in topics if t.name in self._stats}
+
+
+class RosGraphBackend(GraphBackend):
+    """
+    Graph backend talking to the running ROS system.
+
+    A single DirectNode serves the graph queries, the parameter services and
+    the topic sampling. A NodeStrategy may create a DirectNode of its own,
+    and two of them must not be open at the same time.
+    """
+
+    def __init__(self, args):
+        self._args = args
+        self._direct_node = None
+
+    def __enter__(self):
+        self._direct_node = DirectNode(self._args).__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._direct_node.__exit__(exc_type, exc_value, traceback)
+        self._direct_node = None
+
+    def get_node_names(self, *, include_hidden_nodes=False):
+        return get_node_names(
+            node=self._direct_node, include_hidden_nodes=include_hidden_nodes
+        )
+
+    def get_subscriber_info(self, *, remote_node_name, include_hidden=False):
+        return get_subscriber_info(
+            node=self._direct_node,
+            remote_node_name=remote_node_name,
+            include_hidden=include_hidden,
+        )
+
+    def get_publisher_info(self, *, remote_node_name, include_hidden=False):
+        return get_publisher_info(
+            node=self._direct_node,
+            remote_node_name=remote_node_name,
+            include_hidden=include_hidden,
+        )
+
+    def get_service_server_info(self, *, remote_node_name, include_hidden=False):
+        return get_service_server_info(
+            node=self._direct_node,
+            remote_node_name=remote_node_name,
+            include_hidden=include_hidden,
+        )
+
+    def get_service_client_info(self, *, remote_node_name, include_hidden=False):
+        return get_service_client_info(
+            node=self._direct_node,
+            remote_node_name=remote_node_name,
+            include_hidden=include_hidden,
+        )
+
+    def get_action_server_info(self, *, remote_node_name, include_hidden=False):
+        return get_action_server_info(
+            node=self._direct_node,
+            remote_node_name=remote_node_name,
+            include_hidden=include_hidden,
+        )
+
+    def get_action_client_info(self, *, remote_node_name, include_hidden=False):
+        return get_action_client_info(
+            node=self._direct_node,
+            remote_node_name=remote_node_name,
+            include_hidden=include_hidden,
+        )
+
+    def list_parameters(self, *, node_name):
+        try:
+            return call_list_parameters(
+                node=self._direct_node, node_name=node_name, timeout=5.0
+            )
+        except RuntimeError:
+            # the node has no parameter services
+            return None
+
+    def describe_parameters(self, *, node_name, parameter_names):
+        response = call_service(
+            node=self._direct_node,
+            srv_type=DescribeParameters,
+            service_name=f"{node_name}/describe_parameters",
+            request=DescribeParameters.Request(names=parameter_names),
+            timeout=5.0,
+        )
+        if response is None:
+            raise RuntimeError(
+                f"Exception while calling service of node '{node_name}'")
+        return response.descriptors
+
+    def get_parameters(self, *, node_name, parameter_names):
+        response = call_service(
+            node=self._direct_node,
+            srv_type=GetParameters,
+            service_name=f"{node_name}/get_parameters",
+            request=GetParameters.Request(names=parameter_names),
+            timeout=5.0,
+        )
+        if response is None:
+            raise RuntimeError(
+                f"Exception while calling service of node '{node_name}'")
+        return response.values
+
+    def sample_topics(self, topics, *, window, match_timeout=0.0):
+        node = self._direct_node.node
+        # count, bytes, bytes of the first message, first and last arrival
+        arrivals = {}
+        subscriptions = []
+
+        def make_callback(name):
+            def callback(msg):
+                now = time.monotonic()
+                arrival = arrivals[name]
+                if arrival[0] == 0:
+                    arrival[2] = len(msg)
+                    arrival[3] = now
+                arrival[0] += 1
+                arrival[1] += len(msg)
+                arrival[4] = now
+            return callback
+
+        for topic in topics:
+            try:
+                msg_type = get_message(topic.types[0])
+            except (AttributeError, ModuleNotFoundError, ValueError):
+                continue
+            arrivals[topic.name] = [0, 0, 0, 0.0, 0.0]
+            subscriptions.append(
+                node.create_subscription(
+                    msg_type,
+                    topic.name,
+                    make_callback(topic.name),
+                    SAMPLING_QOS,
+                    raw=True,
+                )
+            )
+        if not subscriptions:
+            return {}
+
+        try:
+            # matching the publishers takes a while, only start the window
+            # once all subscriptions are matched or match_timeout has passed
+            deadline = time.monotonic() + match_timeout
+            while time.monotonic() < deadline and any(
+                s.get_publisher_count() == 0 for s in subscriptions
+            ):
+                rclpy.spin_once(node, timeout_sec=0.01)
+            end = time.monotonic() + window
+            now = time.monotonic()
+            while now < end:
+                rclpy.spin_once(node, timeout_sec=end - now)
+                now = time.monotonic()
+        finally:
+            for subscription in subscriptions:
+                node.destroy_subscription(subscription)
+
+        return {
+            name: get_topic_stats(*arrival, window=window)
+            for name, arrival in arrivals.items()
+        }
+
+
+def get_topic_stats(count, size, first_size, first, last, *, window):
+    """
+    Compute the rate and bandwidth of a topic from its arrivals.
+
+    Like `ros2 topic hz`, the rate is measured from the first to the last
+    arrival, so the time until the first message does not count. With fewer
+    than two messages it falls back to the whole window.
+    """
+    if count < 2 or last <= first:
+        return TopicStats(count / window, size / window)
+    span = last - first
+    return TopicStats((count - 1) / span, (size - first_size) / span)
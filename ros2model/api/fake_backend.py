@@ -0,0 +1,149 @@
+import time
+from collections import Counter
+
+from rcl_interfaces.msg import (ParameterDescriptor, ParameterType,
+                                ParameterValue)
+from ros2node.api import NodeName, TopicInfo
+
+from ros2model.api.backend import GraphBackend, TopicStats
+
+
+class FakeGraphBackend(GraphBackend):
+    """
+    In-memory graph backend simulating a running system.
+
+    Every node `/fake/node_<i>` has the configured number of endpoints of each
+    kind and integer parameters. Each call to the backend sleeps for
+    `latency` seconds to mimic a round trip and is counted in `call_counts`.
+    Every topic publishes `topic_rate` messages of `message_size` bytes per
+    second; sampling blocks for the whole window like a real subscription,
+    the topics are matched right away.
+    """
+
+    def __init__(
+        self,
+        *,
+        num_nodes,
+        num_subscribers=2,
+        num_publishers=2,
+        num_service_servers=1,
+        num_service_clients=1,
+        num_action_servers=0,
+        num_action_clients=0,
+        num_parameters=5,
+        latency=0.0,
+        topic_rate=10.0,
+        message_size=64,
+        namespace="/fake",
+    ):
+        self.num_subscribers = num_subscribers
+        self.num_publishers = num_publishers
+        self.num_service_servers = num_service_servers
+        self.num_service_clients = num_service_clients
+        self.num_action_servers = num_action_servers
+        self.num_action_clients = num_action_clients
+        self.num_parameters = num_parameters
+        self.latency = latency
+        self.topic_rate = topic_rate
+        self.message_size = message_size
+        self.call_counts = Counter()
+        self._node_names = [
+            NodeName(f"node_{i}", namespace, f"{namespace}/node_{i}")
+            for i in range(num_nodes)
+        ]
+        self._full_names = {n.full_name for n in self._node_names}
+
+    @property
+    def total_calls(self):
+        return sum(self.call_counts.values())
+
+    def _call(self, name):
+        self.call_counts[name] += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _endpoints(self, remote_node_name, kind, count, type_name):
+        if remote_node_name not in self._full_names:
+            return []
+        # fix_topic_types() edits the type lists in place, hand out new ones
+        return [
+            TopicInfo(f"{remote_node_name}/{kind}_{i}", [type_name])
+            for i in range(count)
+        ]
+
+    def get_node_names(self, *, include_hidden_nodes=False):
+        self._call("get_node_names")
+        return list(self._node_names)
+
+    def get_subscriber_info(self, *, remote_node_name, include_hidden=False):
+        self._call("get_subscriber_info")
+        return self._endpoints(
+            remote_node_name, "sub", self.num_subscribers, "std_msgs/msg/String"
+        )
+
+    def get_publisher_info(self, *, remote_node_name, include_hidden=False):
+        self._call("get_publisher_info")
+        return self._endpoints(
+            remote_node_name, "pub", self.num_publishers, "std_msgs/msg/String"
+        )
+
+    def get_service_server_info(self, *, remote_node_name, include_hidden=False):
+        self._call("get_service_server_info")
+        return self._endpoints(
+            remote_node_name, "srv", self.num_service_servers,
+            "std_srvs/srv/Trigger",
+        )
+
+    def get_service_client_info(self, *, remote_node_name, include_hidden=False):
+        self._call("get_service_client_info")
+        return self._endpoints(
+            remote_node_name, "cli", self.num_service_clients,
+            "std_srvs/srv/Trigger",
+        )
+
+    def get_action_server_info(self, *, remote_node_name, include_hidden=False):
+        self._call("get_action_server_info")
+        return self._endpoints(
+            remote_node_name, "act_srv", self.num_action_servers,
+            "example_interfaces/action/Fibonacci",
+        )
+
+    def get_action_client_info(self, *, remote_node_name, include_hidden=False):
+        self._call("get_action_client_info")
+        return self._endpoints(
+            remote_node_name, "act_cli", self.num_action_clients,
+            "example_interfaces/action/Fibonacci",
+        )
+
+    def list_parameters(self, *, node_name):
+        self._call("list_parameters")
+        if node_name not in self._full_names:
+            return None
+        return [f"param_{i}" for i in range(self.num_parameters)]
+
+    def describe_parameters(self, *, node_name, parameter_names):
+        self._call("describe_parameters")
+        return [
+            ParameterDescriptor(
+                name=name, type=ParameterType.PARAMETER_INTEGER)
+            for name in parameter_names
+        ]
+
+    def get_parameters(self, *, node_name, parameter_names):
+        self._call("get_parameters")
+        return [
+            ParameterValue(
+                type=ParameterType.PARAMETER_INTEGER,
+                integer_value=int(name.rsplit("_", 1)[-1]),
+            )
+            for name in parameter_names
+        ]
+
+    def sample_topics(self, topics, *, window, match_timeout=0.0):
+        self._call("sample_topics")
+        time.sleep(window)
+        return {
+            topic.name: TopicStats(
+                self.topic_rate, self.topic_rate * self.message_size)
+            for topic in topics
+        }
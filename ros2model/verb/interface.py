@@ -5,7 +5,8 @@ from jinja2 import Environment, FileSystemLoader
 from ros2cli.node.strategy import add_arguments
 from ros2interface.api import get_interface_packages
 
-from ros2model.api import process_action_dir, process_msg_dir, process_srv_dir
+from ros2model.api import (NestedTypeResolver, process_action_dir,
+                           process_msg_dir, process_srv_dir)
 from ros2model.verb import VerbExtension
 
 
@@ -35,15 +36,22 @@ class InterfacePackageVerb(VerbExtension):
             help="The output file for the generated model.",
         )
 
-    def gen(self, interface_package_name, output_file):
+        parser.add_argument(
+            "--expand",
+            action="store_true",
+            help="Inline nested types as flattened fields instead of references",
+        )
+
+    def gen(self, interface_package_name, output_file, resolver=None):
         package_share_path = get_package_share_directory(
             interface_package_name)
         msg_path = Path(package_share_path) / "msg"
         srv_path = Path(package_share_path) / "srv"
         actions_path = Path(package_share_path) / "action"
-        msgs = process_msg_dir(msg_path, interface_package_name)
-        srvs = process_srv_dir(srv_path, interface_package_name)
-        actions = process_action_dir(actions_path, interface_package_name)
+        msgs = process_msg_dir(msg_path, interface_package_name, resolver)
+        srvs = process_srv_dir(srv_path, interface_package_name, resolver)
+        actions = process_action_dir(
+            actions_path, interface_package_name, resolver)
         print(
             "Found {} messages, {} services and {} actions.".format(
                 len(msgs), len(srvs), len(actions)
@@ -69,10 +77,12 @@ class InterfacePackageVerb(VerbExtension):
         output_file.write_bytes(contents.encode("utf-8"))
 
     def main(self, *, args):
+        # one resolver for the whole run, so each type is only resolved once
+        resolver = NestedTypeResolver() if args.expand else None
         if args.all:
             interface_pkgs = get_interface_packages()
             for pkg in interface_pkgs:
-                self.gen(pkg, f"{args.output}/{pkg}.ros")
+                self.gen(pkg, f"{args.output}/{pkg}.ros", resolver)
         else:
             self.gen(args.interface_package_name,
-                     f"{args.interface_package_name}.ros")
+                     f"{args.interface_package_name}.ros", resolver)
@@ -1,57 +1,144 @@
+import argparse
+import multiprocessing
+import os
+import queue
 import re
 import sys
+import time
 from collections import namedtuple
 from pathlib import Path
 from typing import List
 
-import rclpy
 from ament_index_python import get_package_share_directory
 from jinja2 import Environment, FileSystemLoader
-from rcl_interfaces.srv import ListParameters
-from ros2cli.node.direct import DirectNode
-from ros2cli.node.strategy import NodeStrategy, add_arguments
+from ros2cli.node.strategy import add_arguments
 from ros2node.api import (INFO_NONUNIQUE_WARNING_TEMPLATE, NodeNameCompleter,
-                          TopicInfo, get_absolute_node_name,
-                          get_action_client_info, get_action_server_info,
-                          get_node_names, get_publisher_info,
-                          get_service_client_info, get_service_server_info,
-                          get_subscriber_info)
-from ros2param.api import (call_describe_parameters, call_get_parameters,
-                           get_value)
+                          TopicInfo, get_absolute_node_name)
+from ros2param.api import get_value
 
 from ros2model.api import (fix_topic_names, fix_topic_types,
                            get_parameter_type_string)
+from ros2model.api.backend import GraphBackend, RosGraphBackend, TopicSampler
 from ros2model.verb import VerbExtension
 
 ParamInfo = namedtuple("Topic", ("name", "types", "default"))
 
 
-def call_list_parameters(*, node, node_name, timeout=None):
-    # create client
-    client = node.create_client(ListParameters, f"{node_name}/list_parameters")
+def get_node_model_template():
+    env = Environment(
+        loader=FileSystemLoader(
+            get_package_share_directory("ros2model") + "/templates"
+        ),
+        autoescape=True,
+    )
+    return env.get_template("node_model.jinja")
 
-    # call as soon as ready
-    ready = client.wait_for_service(timeout_sec=5.0)
-    if not ready:
-        raise RuntimeError("Wait for service timed out")
 
-    request = ListParameters.Request()
-    future = client.call_async(request)
-    rclpy.spin_until_future_complete(
-        node=node, future=future, timeout_sec=timeout)
+def positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return number
 
-    # handle response
-    response = future.result()
-    if response is None:
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def create_sampler(backend, args):
+    """Return a TopicSampler configured from args, None if disabled."""
+    if not args.sample_topics:
+        return None
+    return TopicSampler(
+        backend,
+        window=args.sample_window,
+        max_subscriptions=args.max_subscriptions,
+        budget=args.sample_budget,
+    )
+
+
+def get_domain_output_dir(output_dir, domain_id):
+    return Path(output_dir) / f"domain_{domain_id}"
+
+
+def scan_domain(domain_id, args):
+    """
+    Generate models for all nodes of one ROS domain.
+
+    Meant to run in its own worker process: the domain is selected through
+    ROS_DOMAIN_ID before the backend creates its context. The models go to
+    `<output_dir>/domain_<id>`.
+    Returns the number of generated models and the scan time in seconds.
+    """
+    os.environ["ROS_DOMAIN_ID"] = str(domain_id)
+    output_dir = get_domain_output_dir(args.output_dir, domain_id)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    with RosGraphBackend(args) as backend:
+        count = RunningNodeVerb().generate_all(
+            backend,
+            output_dir,
+            args.generate_value,
+            args.include_hidden,
+            sampler=create_sampler(backend, args),
+        )
+    return count, time.perf_counter() - start
+
+
+def _scan_domain_process(domain_id, args, results):
+    output_dir = get_domain_output_dir(args.output_dir, domain_id)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "scan.log", "w") as log:
+        # the process scans a single domain, so its whole stdout and stderr,
+        # including the native rcl logging, go to the log of the domain
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(log.fileno(), sys.stdout.fileno())
+        os.dup2(log.fileno(), sys.stderr.fileno())
         try:
-            e = future.exception()
-        except:
-            error = RuntimeError(
-                f"Exception while calling service of node '{node_name}': {e}"
-            )
-        return response
-    else:
-        return response.result.names
+            results.put((domain_id, scan_domain(domain_id, args)))
+        except Exception as e:
+            # exceptions are not necessarily picklable, report them as text
+            results.put((domain_id, f"{type(e).__name__}: {e}"))
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+
+def report_domain_scans(output_dir, domains, results, exitcodes, total):
+    """
+    Write the timing summary of a multi-domain scan.
+
+    results maps the domain ids to the (count, seconds) of their scan or to
+    an error message. Domains without a result are reported as failed with
+    the exit code of their worker from exitcodes. The summary is written to
+    `<output_dir>/timing_summary.txt`.
+    Returns the summary and an error message if any domain failed, else None.
+    """
+    lines = [f"{'domain':>8} {'nodes':>8} {'time [s]':>10}"]
+    failed = False
+    for domain_id in domains:
+        result = results.get(domain_id)
+        if result is None:
+            result = f"worker exited with code {exitcodes.get(domain_id)}"
+        if isinstance(result, str):
+            failed = True
+            lines.append(f"{domain_id:>8} failed: {result}")
+        else:
+            count, elapsed = result
+            lines.append(f"{domain_id:>8} {count:>8} {elapsed:>10.3f}")
+    lines.append(f"Total wall time: {total:.3f} s")
+    summary = "\n".join(lines)
+    summary_file = Path(output_dir) / "timing_summary.txt"
+    summary_file.parent.mkdir(parents=True, exist_ok=True)
+    summary_file.write_text(summary + "\n")
+    if failed:
+        return summary, "Scanning failed for some domains, see " + str(
+            summary_file.absolute())
+    return summary, None
 
 
 class RunningNodeVerb(VerbExtension):
@@ -72,6 +159,14 @@ class RunningNodeVerb(VerbExtension):
             action="store_true",
             help="Generate models for all node in current running system",
         )
+        group.add_argument(
+            "--domains",
+            type=int,
+            nargs="+",
+            metavar="DOMAIN_ID",
+            help="Generate models for all nodes of each given ROS domain, "
+            "scanning the domains in parallel processes",
+        )
 
         parser.add_argument(
             "--include-hidden",
@@ -99,7 +194,44 @@ class RunningNodeVerb(VerbExtension):
             help="Wheather adding parameter value",
         )
 
-    def create_a_node_model(self, target_node_name, output, if_param_value, args):
+        parser.add_argument(
+            "--sample-topics",
+            action="store_true",
+            help="Measure message rate and bandwidth of the published topics, "
+            "summed over all publishers of a topic",
+        )
+        parser.add_argument(
+            "--sample-window",
+            type=positive_float,
+            default=1.0,
+            help="Seconds each topic is sampled (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--max-subscriptions",
+            type=positive_int,
+            default=32,
+            help="Maximum number of topics sampled at the same time "
+            "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--sample-budget",
+            type=positive_float,
+            default=30.0,
+            help="Total seconds spent sampling, topics left over when it is "
+            "used up are not sampled (default: %(default)s)",
+        )
+
+    def create_a_node_model(
+        self,
+        backend: GraphBackend,
+        target_node_name,
+        output,
+        if_param_value,
+        include_hidden,
+        node_names=None,
+        template=None,
+        sampler: TopicSampler = None,
+    ):
         subscribers: List[TopicInfo] = []
         publishers: List[TopicInfo] = []
         service_clients: List[TopicInfo] = []
@@ -107,107 +239,103 @@ class RunningNodeVerb(VerbExtension):
         action_clients: List[TopicInfo] = []
         action_servers: List[TopicInfo] = []
         parameters: List[ParamInfo] = []
+        publisher_stats = {}
 
-        with NodeStrategy(args) as node:
-            node_name = get_absolute_node_name(target_node_name)
-            node_names = get_node_names(
-                node=node, include_hidden_nodes=args.include_hidden
+        node_name = get_absolute_node_name(target_node_name)
+        if node_names is None:
+            node_names = backend.get_node_names(
+                include_hidden_nodes=include_hidden)
+        count = [n.full_name for n in node_names].count(node_name)
+        if count > 1:
+            print(
+                INFO_NONUNIQUE_WARNING_TEMPLATE.format(
+                    num_nodes=count, node_name=target_node_name
+                ),
+                file=sys.stderr,
             )
-            count = [n.full_name for n in node_names].count(node_name)
-            if count > 1:
-                print(
-                    INFO_NONUNIQUE_WARNING_TEMPLATE.format(
-                        num_nodes=count, node_name=target_node_name
-                    ),
-                    file=sys.stderr,
-                )
-            if count > 0:
-                print(target_node_name)
-                subscribers = get_subscriber_info(
-                    node=node,
-                    remote_node_name=target_node_name,
-                    include_hidden=args.include_hidden,
-                )
-                fix_topic_types(node_name, subscribers)
-                subscribers = fix_topic_names(node_name, subscribers)
+        if count > 0:
+            print(target_node_name)
+            subscribers = backend.get_subscriber_info(
+                remote_node_name=target_node_name,
+                include_hidden=include_hidden,
+            )
+            fix_topic_types(node_name, subscribers)
+            subscribers = fix_topic_names(node_name, subscribers)
 
-                publishers = get_publisher_info(
-                    node=node,
-                    remote_node_name=target_node_name,
-                    include_hidden=args.include_hidden,
-                )
-                fix_topic_types(node_name, publishers)
-                publishers = fix_topic_names(node_name, publishers)
+            publishers = backend.get_publisher_info(
+                remote_node_name=target_node_name,
+                include_hidden=include_hidden,
+            )
+            if sampler is not None:
+                stats = sampler.sample(publishers)
+            fix_topic_types(node_name, publishers)
+            raw_names = [p.name for p in publishers]
+            publishers = fix_topic_names(node_name, publishers)
+            if sampler is not None:
+                publisher_stats = {
+                    publisher.name: stats[raw_name]
+                    for raw_name, publisher in zip(raw_names, publishers)
+                    if raw_name in stats
+                }
 
-                service_servers = get_service_server_info(
-                    node=node,
-                    remote_node_name=target_node_name,
-                    include_hidden=args.include_hidden,
-                )
-                fix_topic_types(node_name, service_servers)
-                service_servers = fix_topic_names(node_name, service_servers)
+            service_servers = backend.get_service_server_info(
+                remote_node_name=target_node_name,
+                include_hidden=include_hidden,
+            )
+            fix_topic_types(node_name, service_servers)
+            service_servers = fix_topic_names(node_name, service_servers)
 
-                service_clients = get_service_client_info(
-                    node=node,
-                    remote_node_name=target_node_name,
-                    include_hidden=args.include_hidden,
-                )
-                fix_topic_types(node_name, service_clients)
-                service_clients = fix_topic_names(node_name, service_clients)
+            service_clients = backend.get_service_client_info(
+                remote_node_name=target_node_name,
+                include_hidden=include_hidden,
+            )
+            fix_topic_types(node_name, service_clients)
+            service_clients = fix_topic_names(node_name, service_clients)
 
-                action_servers = get_action_server_info(
-                    node=node,
-                    remote_node_name=target_node_name,
-                    include_hidden=args.include_hidden,
-                )
-                fix_topic_types(node_name, action_servers)
-                action_servers = fix_topic_names(node_name, action_servers)
+            action_servers = backend.get_action_server_info(
+                remote_node_name=target_node_name,
+                include_hidden=include_hidden,
+            )
+            fix_topic_types(node_name, action_servers)
+            action_servers = fix_topic_names(node_name, action_servers)
 
-                action_clients = get_action_client_info(
-                    node=node,
-                    remote_node_name=target_node_name,
-                    include_hidden=args.include_hidden,
-                )
-                fix_topic_types(node_name, action_clients)
-                action_clients = fix_topic_names(node_name, action_clients)
-            else:
-                return "Unable to find node '" + target_node_name + "'"
+            action_clients = backend.get_action_client_info(
+                remote_node_name=target_node_name,
+                include_hidden=include_hidden,
+            )
+            fix_topic_types(node_name, action_clients)
+            action_clients = fix_topic_names(node_name, action_clients)
+        else:
+            return "Unable to find node '" + target_node_name + "'"
 
-        with DirectNode(args) as node:
-            response = call_list_parameters(
-                node=node, node_name=node_name, timeout=5.0)
+        response = backend.list_parameters(node_name=node_name)
 
-            if response is not None:
-                sorted_names = sorted(response)
-                describe_resp = call_describe_parameters(
-                    node=node, node_name=node_name, parameter_names=sorted_names
-                )
-                for descriptor in describe_resp.descriptors:
-                    get_value_resp = call_get_parameters(
-                        node=node,
-                        node_name=node_name,
-                        parameter_names=[descriptor.name],
-                    )
-                    parameters.append(
-                        ParamInfo(
-                            descriptor.name,
-                            get_parameter_type_string(descriptor.type),
-                            get_value(
-                                parameter_value=get_value_resp.values[0]),
-                        )
+        if response is not None:
+            sorted_names = sorted(response)
+            descriptors = backend.describe_parameters(
+                node_name=node_name, parameter_names=sorted_names
+            )
+            # fetch all values in one request instead of one per parameter
+            values = backend.get_parameters(
+                node_name=node_name,
+                parameter_names=[d.name for d in descriptors],
+            )
+            for descriptor, value in zip(descriptors, values):
+                parameters.append(
+                    ParamInfo(
+                        descriptor.name,
+                        get_parameter_type_string(descriptor.type),
+                        get_value(parameter_value=value),
                     )
+                )
 
-        env = Environment(
-            loader=FileSystemLoader(
-                get_package_share_directory("ros2model") + "/templates"
-            ),
-            autoescape=True,
-        )
-        template = env.get_template("node_model.jinja")
+        if template is None:
+            template = get_node_model_template()
         contents = template.render(
             node_name=target_node_name,
             subscribers=subscribers,
             publishers=publishers,
+            publisher_stats=publisher_stats,
             service_clients=service_clients,
             service_servers=service_servers,
             action_clients=action_clients,
@@ -229,25 +357,103 @@ class RunningNodeVerb(VerbExtension):
         output_file.touch()
         output_file.write_text(contents)
 
+    def generate_all(
+        self,
+        backend: GraphBackend,
+        output_dir,
+        if_param_value,
+        include_hidden,
+        sampler: TopicSampler = None,
+    ):
+        """Create a model for every node of the graph, return their number."""
+        # the graph is listed once and reused for every node
+        node_names = backend.get_node_names(
+            include_hidden_nodes=include_hidden)
+        template = get_node_model_template()
+        count = 0
+        for tmp_node in node_names:
+            if not re.search(r"transform_listener_impl", tmp_node.full_name):
+                self.create_a_node_model(
+                    backend,
+                    tmp_node.full_name,
+                    f"{output_dir}/{tmp_node.name}.ros2",
+                    if_param_value,
+                    include_hidden,
+                    node_names=node_names,
+                    template=template,
+                    sampler=sampler,
+                )
+                count += 1
+        return count
+
+    def scan_domains(self, args):
+        """Scan every domain of args.domains in its own worker process."""
+        # only plain arguments are passed on, the extensions stored by ros2cli
+        # under private names are not needed by the workers
+        worker_args = argparse.Namespace(
+            **{k: v for k, v in vars(args).items() if not k.startswith("_")}
+        )
+        domains = sorted(set(args.domains))
+        results = {}
+        start = time.perf_counter()
+        # one spawned process per domain, so every domain is scanned with its
+        # own fresh rclpy context
+        context = multiprocessing.get_context("spawn")
+        result_queue = context.Queue()
+        processes = [
+            context.Process(
+                target=_scan_domain_process,
+                args=(domain_id, worker_args, result_queue),
+            )
+            for domain_id in domains
+        ]
+        for process in processes:
+            process.start()
+        while len(results) < len(domains):
+            try:
+                domain_id, result = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes) \
+                        and result_queue.empty():
+                    break
+                continue
+            results[domain_id] = result
+        for process in processes:
+            process.join()
+        total = time.perf_counter() - start
+
+        summary, error = report_domain_scans(
+            args.output_dir,
+            domains,
+            results,
+            {d: p.exitcode for d, p in zip(domains, processes)},
+            total,
+        )
+        print(summary)
+        return error
+
     def main(self, *, args):
-        if not args.generate_all:
-            if args.output != Path.cwd():
+        if args.domains:
+            return self.scan_domains(args)
+        with RosGraphBackend(args) as backend:
+            if not args.generate_all:
+                if args.output != Path.cwd():
+                    output = args.output
+                else:
+                    output = f"{args.node_name}.ros2"
                 self.create_a_node_model(
-                    args.node_name, args.output, args.generate_value, args
+                    backend,
+                    args.node_name,
+                    output,
+                    args.generate_value,
+                    args.include_hidden,
+                    sampler=create_sampler(backend, args),
                 )
             else:
-                self.create_a_node_model(
-                    args.node_name, f"{args.node_name}.ros2", args.generate_value, args
+                self.generate_all(
+                    backend,
+                    args.output_dir,
+                    args.generate_value,
+                    args.include_hidden,
+                    sampler=create_sampler(backend, args),
                 )
-        else:
-            with NodeStrategy(args) as node:
-                for tmp_node in get_node_names(
-                    node=node, include_hidden_nodes=args.include_hidden
-                ):
-                    if not re.search(r"transform_listener_impl", tmp_node.full_name):
-                        self.create_a_node_model(
-                            tmp_node.full_name,
-                            f"{args.output_dir}/{tmp_node.name}.ros2",
-                            args.generate_value,
-                            args,
-                        )
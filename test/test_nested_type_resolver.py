@@ -0,0 +1,99 @@
+import pytest
+from ament_index_python.packages import PackageNotFoundError
+
+import ros2model.api
+from ros2model.api import NestedTypeResolver, get_type_format, process_msg_file
+
+
+@pytest.fixture
+def share_with_lookups(tmp_path, monkeypatch):
+    """Create a fake share directory and resolve packages from it."""
+    specs = {
+        "geo/msg/Point.msg": "float64 x\nfloat64 y\n",
+        "geo/msg/Pose.msg": "geo/Point position\ngeo/Point orientation\n",
+        "geo/msg/Path.msg": "geo/Pose[] poses\nstring frame # comment\n",
+        "geo/msg/Broken.msg": "Unknown thing\nother/Missing other\n",
+        "geo/msg/Loop.msg": "geo/Loop next\n",
+        "geo/msg/A.msg": "geo/B b\n",
+        "geo/msg/B.msg": "geo/A a\n",
+    }
+    for name, content in specs.items():
+        spec_file = tmp_path / name
+        spec_file.parent.mkdir(parents=True, exist_ok=True)
+        spec_file.write_text(content)
+
+    lookups = []
+
+    def get_package_share_directory(package_name):
+        lookups.append(package_name)
+        if not (tmp_path / package_name).is_dir():
+            raise PackageNotFoundError(package_name)
+        return str(tmp_path / package_name)
+
+    monkeypatch.setattr(
+        ros2model.api, "get_package_share_directory",
+        get_package_share_directory)
+    return tmp_path, lookups
+
+
+@pytest.fixture
+def share(share_with_lookups):
+    """Return only the fake share directory."""
+    return share_with_lookups[0]
+
+
+def test_expand_nested_fields(share):
+    name, message = process_msg_file(
+        share / "geo/msg/Pose.msg", "geo", NestedTypeResolver())
+    assert name == "Pose"
+    assert message == {
+        "position.x": "float64",
+        "position.y": "float64",
+        "orientation.x": "float64",
+        "orientation.y": "float64",
+    }
+
+
+def test_expand_array_fields(share):
+    _, message = process_msg_file(
+        share / "geo/msg/Path.msg", "geo", NestedTypeResolver())
+    assert message == {
+        "poses[].position.x": "float64",
+        "poses[].position.y": "float64",
+        "poses[].orientation.x": "float64",
+        "poses[].orientation.y": "float64",
+        "frame": "string",
+    }
+
+
+def test_types_are_resolved_once(share_with_lookups):
+    share, lookups = share_with_lookups
+    resolver = NestedTypeResolver()
+    process_msg_file(share / "geo/msg/Path.msg", "geo", resolver)
+    process_msg_file(share / "geo/msg/Pose.msg", "geo", resolver)
+    # Path references Pose, Pose references Point twice
+    assert lookups == ["geo", "geo"]
+    assert resolver.resolve("geo/msg/Point") is resolver.resolve(
+        "geo/msg/Point")
+    assert lookups == ["geo", "geo"]
+
+
+def test_unknown_types_stay_references(share):
+    _, expanded = process_msg_file(
+        share / "geo/msg/Broken.msg", "geo", NestedTypeResolver())
+    _, plain = process_msg_file(share / "geo/msg/Broken.msg", "geo")
+    assert expanded == plain == {
+        "thing": "'geo/msg/Unknown'[]",
+        "other": "'other/msg/Missing'[]",
+    }
+    assert get_type_format("Unknown thing", "geo") == (
+        "thing", "'geo/msg/Unknown'[]")
+
+
+@pytest.mark.parametrize("type_name, cycle", [
+    ("geo/msg/Loop", "geo/msg/Loop -> geo/msg/Loop"),
+    ("geo/msg/A", "geo/msg/A -> geo/msg/B -> geo/msg/A"),
+])
+def test_cycles_are_detected(share, type_name, cycle):
+    with pytest.raises(ValueError, match=cycle):
+        NestedTypeResolver().resolve(type_name)
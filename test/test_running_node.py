@@ -0,0 +1,112 @@
+from pathlib import Path
+
+import pytest
+
+import ros2model.verb.running_node
+from ros2model.api.fake_backend import FakeGraphBackend
+from ros2model.verb.running_node import (RunningNodeVerb,
+                                         get_domain_output_dir,
+                                         report_domain_scans)
+
+
+@pytest.fixture(autouse=True)
+def templates(monkeypatch):
+    """Load the templates from the source tree instead of the install space."""
+    source_dir = str(Path(__file__).resolve().parents[1])
+    monkeypatch.setattr(
+        ros2model.verb.running_node, "get_package_share_directory",
+        lambda package_name: source_dir)
+
+
+def test_generate_all(tmp_path, capsys):
+    backend = FakeGraphBackend(
+        num_nodes=3,
+        num_subscribers=1,
+        num_publishers=2,
+        num_service_servers=1,
+        num_service_clients=0,
+        num_parameters=2,
+    )
+    count = RunningNodeVerb().generate_all(backend, tmp_path, True, False)
+
+    assert count == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "node_0.ros2", "node_1.ros2", "node_2.ros2"]
+    contents = (tmp_path / "node_1.ros2").read_text()
+    assert contents.startswith("fake/node_1:\n")
+    assert '"~/sub_0":\n          type: "std_msgs/msg/String"' in contents
+    assert '"~/pub_1":\n          type: "std_msgs/msg/String"' in contents
+    assert '"~/srv_0":\n          type: "std_srvs/srv/Trigger"' in contents
+    assert "serviceclients" not in contents
+    assert "node_0" not in contents
+    assert '"param_0":\n          type: Integer\n          value: 0' in contents
+    assert '"param_1":\n          type: Integer\n          value: 1' in contents
+
+    # the graph is listed once, parameters are fetched in one call per node
+    assert backend.call_counts["get_node_names"] == 1
+    assert backend.call_counts["list_parameters"] == 3
+    assert backend.call_counts["describe_parameters"] == 3
+    assert backend.call_counts["get_parameters"] == 3
+
+
+def test_create_a_node_model(tmp_path, capsys):
+    backend = FakeGraphBackend(num_nodes=2, num_parameters=0)
+    output = tmp_path / "model" / "node.ros2"
+    RunningNodeVerb().create_a_node_model(
+        backend, "/fake/node_0", output, False, False)
+
+    assert output.read_text().startswith("fake/node_0:\n")
+    assert "parameters:" not in output.read_text()
+    assert backend.call_counts["get_node_names"] == 1
+    assert backend.call_counts["describe_parameters"] == 1
+    assert backend.call_counts["get_parameters"] == 1
+
+
+def test_unknown_node(tmp_path):
+    backend = FakeGraphBackend(num_nodes=1)
+    output = tmp_path / "node.ros2"
+    result = RunningNodeVerb().create_a_node_model(
+        backend, "/fake/missing", output, False, False)
+
+    assert result == "Unable to find node '/fake/missing'"
+    assert not output.exists()
+    assert backend.call_counts["get_publisher_info"] == 0
+
+
+def test_domain_output_dir():
+    assert get_domain_output_dir("models", 7) == Path("models/domain_7")
+
+
+def test_report_domain_scans(tmp_path):
+    summary, error = report_domain_scans(
+        tmp_path, [0, 3], {3: (2, 0.5), 0: (10, 1.25)}, {0: 0, 3: 0}, 1.5)
+
+    assert error is None
+    assert summary.splitlines() == [
+        "  domain    nodes   time [s]",
+        "       0       10      1.250",
+        "       3        2      0.500",
+        "Total wall time: 1.500 s",
+    ]
+    assert (tmp_path / "timing_summary.txt").read_text() == summary + "\n"
+
+
+def test_report_failed_domain_scans(tmp_path):
+    # domain 1 raised in its worker, the worker of domain 2 died silently
+    summary, error = report_domain_scans(
+        tmp_path / "out",
+        [0, 1, 2],
+        {0: (1, 0.25), 1: "RuntimeError: Wait for service timed out"},
+        {0: 0, 1: 0, 2: -9},
+        2.0,
+    )
+
+    lines = summary.splitlines()
+    assert lines[1] == "       0        1      0.250"
+    assert lines[2] == \
+        "       1 failed: RuntimeError: Wait for service timed out"
+    assert lines[3] == "       2 failed: worker exited with code -9"
+    summary_file = tmp_path / "out" / "timing_summary.txt"
+    assert summary_file.read_text() == summary + "\n"
+    assert error == "Scanning failed for some domains, see " + str(
+        summary_file.absolute())
@@ -0,0 +1,102 @@
+import argparse
+
+import pytest
+from ros2node.api import TopicInfo
+
+import ros2model.api.backend
+from ros2model.api.backend import (RosGraphBackend, TopicSampler,
+                                   get_topic_stats)
+from ros2model.api.fake_backend import FakeGraphBackend
+
+
+def make_topics(count, prefix="/topic"):
+    return [TopicInfo(f"{prefix}_{i}", ["std_msgs/msg/String"])
+            for i in range(count)]
+
+
+def test_topics_are_sampled_in_batches():
+    backend = FakeGraphBackend(num_nodes=0, topic_rate=5.0, message_size=10)
+    sampler = TopicSampler(
+        backend, window=0.001, max_subscriptions=2, budget=float("inf"))
+    stats = sampler.sample(make_topics(5))
+    assert backend.call_counts["sample_topics"] == 3
+    assert len(stats) == 5
+    assert stats["/topic_0"] == (5.0, 50.0)
+
+
+def test_topics_are_sampled_once():
+    backend = FakeGraphBackend(num_nodes=0)
+    sampler = TopicSampler(
+        backend, window=0.001, max_subscriptions=10, budget=float("inf"))
+    sampler.sample(make_topics(3))
+    # shared topics like /rosout are reused, only new ones are sampled
+    stats = sampler.sample(make_topics(3) + make_topics(1, "/other"))
+    assert backend.call_counts["sample_topics"] == 2
+    assert len(stats) == 4
+    sampler.sample(make_topics(3))
+    assert backend.call_counts["sample_topics"] == 2
+
+
+def test_sampling_stops_when_budget_is_used_up():
+    backend = FakeGraphBackend(num_nodes=0)
+    sampler = TopicSampler(
+        backend, window=0.05, max_subscriptions=2, budget=0.075)
+    stats = sampler.sample(make_topics(6))
+    assert backend.call_counts["sample_topics"] == 1
+    assert sorted(stats) == ["/topic_0", "/topic_1"]
+    assert sampler.sample(make_topics(6, "/other")) == {}
+    assert backend.call_counts["sample_topics"] == 1
+
+
+def test_matching_wait_stays_within_budget():
+    match_timeouts = []
+
+    class Backend(FakeGraphBackend):
+        def sample_topics(self, topics, *, window, match_timeout=0.0):
+            match_timeouts.append(match_timeout)
+            return super().sample_topics(topics, window=window)
+
+    sampler = TopicSampler(
+        Backend(num_nodes=0), window=0.05, max_subscriptions=1, budget=0.13)
+    sampler.sample(make_topics(3))
+    # a batch may wait one window at most, less when the budget is short
+    assert len(match_timeouts) == 2
+    assert match_timeouts[0] == pytest.approx(0.05)
+    assert match_timeouts[1] < 0.03
+
+
+def test_unsubscribable_topics_are_skipped(monkeypatch):
+    def get_message(type_name):
+        raise ModuleNotFoundError(type_name)
+
+    def spin_once(*args, **kwargs):
+        raise AssertionError("nothing to spin for")
+
+    class DirectNode:
+        node = None
+
+    monkeypatch.setattr(ros2model.api.backend, "get_message", get_message)
+    monkeypatch.setattr(ros2model.api.backend.rclpy, "spin_once", spin_once)
+    backend = RosGraphBackend(argparse.Namespace())
+    backend._direct_node = DirectNode()
+    assert backend.sample_topics(make_topics(2), window=10.0) == {}
+
+
+@pytest.mark.parametrize("window, max_subscriptions", [(0, 1), (-1, 1), (1, 0)])
+def test_invalid_limits_are_rejected(window, max_subscriptions):
+    with pytest.raises(ValueError):
+        TopicSampler(
+            FakeGraphBackend(num_nodes=0),
+            window=window,
+            max_subscriptions=max_subscriptions,
+            budget=1.0,
+        )
+
+
+def test_topic_stats_are_measured_between_arrivals():
+    # 11 messages of 100 bytes, 0.1 s apart, in a window of 2 s
+    stats = get_topic_stats(11, 1100, 100, 5.0, 6.0, window=2.0)
+    assert stats.rate == pytest.approx(10.0)
+    assert stats.bandwidth == pytest.approx(1000.0)
+    assert get_topic_stats(1, 100, 100, 5.0, 5.0, window=2.0) == (0.5, 50.0)
+    assert get_topic_stats(0, 0, 0, 0.0, 0.0, window=2.0) == (0.0, 0.0)